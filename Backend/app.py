@@ -1,14 +1,24 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, g, send_file
 from flask_cors import CORS
+import functools
+import hashlib
 import json
 import os
-import tempfile
+import pstats
+import re
 from dotenv import load_dotenv
-from utils.gemini import generate_educational_notes, generate_context_image
+from utils.gemini import generate_educational_notes_with_status, generate_context_image, get_cache_stats, extract_video_id
 from utils.document_analyzer import extract_text_from_file, analyze_document_content
 from utils.roadmap_generator import DynamicLearningRoadmapGenerator
-from utils.question_generator import generate_question_bank
+from utils.question_generator import generate_question_bank, generate_questions_from_text
 from utils.image_generator import generate_image_from_notes
+from utils.compression import finalize_response
+from utils.uploads import save_upload, remove_upload, UploadError, MAX_UPLOAD_SIZE
+from utils.artifact_store import artifact_store, ARTIFACT_KINDS, history_enabled, is_admin_request
+from utils.deadline import Deadline, DeadlineExceeded, deadline_scope, current_deadline, parse_timeout, client_disconnected, REQUEST_TIMEOUT_SECONDS
+from utils.model_router import model_router, track_models, current_models
+from utils.prefetcher import prefetcher
+from utils.profiler import profile_store, profiling_enabled, is_authorized, requested_mode, summarize_stats
 
 # Load environment variables
 load_dotenv()
@@ -20,7 +30,17 @@ allowed_origins = [
     "http://localhost:5173"
 ]
 
+# Request headers the frontend may send, for both CORS configurations and after_request
+ALLOWED_HEADERS = ["Content-Type", "Authorization", "X-Request-Timeout", "X-Profile", "X-Profile-Token", "X-Admin-Token"]
+
+# /api/generate-visual only looks at this many characters of the notes
+VISUAL_CONTENT_LIMIT = 1000
+# GetNotes.jsx sends this many leading characters of the notes when visualizing
+NOTES_VISUAL_PREFIX_CHARS = 500
+
 app = Flask(__name__)
+# Reject oversized request bodies before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
 
 
 if os.getenv('DEBUG', 'True').lower() == 'true':
@@ -29,7 +49,7 @@ if os.getenv('DEBUG', 'True').lower() == 'true':
          resources={r"/*": {
              "origins": "*",
              "methods": ["GET", "POST", "OPTIONS"],
-             "allow_headers": ["Content-Type", "Authorization"],
+             "allow_headers": ALLOWED_HEADERS,
              "supports_credentials": False,
              "max_age": 3600
          }}
@@ -40,13 +60,62 @@ else:
          resources={r"/*": {
              "origins": allowed_origins,
              "methods": ["GET", "POST", "OPTIONS"],
-             "allow_headers": ["Content-Type", "Authorization"],
+             "allow_headers": ALLOWED_HEADERS,
              "supports_credentials": False,
              "max_age": 3600,
-             "expose_headers": ["Content-Type", "Content-Length"]
+             "expose_headers": ["Content-Type", "Content-Length", "Content-Encoding", "ETag", "X-Artifact-Id", "X-Artifact-Cached", "X-Profile-Id"]
          }}
     )
 
+# Opt-in request profiling. These hooks are registered before the CORS/compression
+# after_request handler so that, running in reverse order, the profile covers it too.
+@app.before_request
+def start_profiling():
+    if request.method == 'OPTIONS' or not profiling_enabled():
+        return
+    mode = requested_mode(request.headers.get('X-Profile') or request.args.get('profile'))
+    if mode and is_authorized(request.headers):
+        g.profile = profile_store.start(mode, stored=True)
+    elif profile_store.should_sample():
+        g.profile = profile_store.start('cprofile', stored=False)
+
+@app.after_request
+def finish_profiling(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile_id = profile_store.finish(profile, f"{request.method} {request.path}")
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.teardown_request
+def stop_profiling(error=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+
+def require_profiling_token(view):
+    """Profile endpoints need the PROFILING_TOKEN and are hidden when profiling is off"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiling_enabled():
+            return jsonify({"error": "Not found"}), 404
+        if not is_authorized(request.headers):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+def require_admin_token(view):
+    """Artifact history endpoints need the ARTIFACT_ADMIN_TOKEN and are hidden without one"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not history_enabled():
+            return jsonify({"error": "Not found"}), 404
+        if not is_admin_request(request.headers):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
 # Add a route specifically for handling OPTIONS requests (preflight)
 @app.route('/', defaults={'path': ''}, methods=['OPTIONS'])
 @app.route('/<path:path>', methods=['OPTIONS'])
@@ -57,7 +126,92 @@ def options_handler(path):
 def index():
     return jsonify({"message": "Hello World"})
 
+def with_deadline(view):
+    """Run a view under a per-request deadline (REQUEST_TIMEOUT_SECONDS or the
+    X-Request-Timeout header) and answer 504 once it expires or the client leaves.
+    Also records which models the request was routed to and counts it as
+    interactive load for the prefetcher."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        environ = request.environ
+        deadline = Deadline(
+            parse_timeout(request.headers.get('X-Request-Timeout')),
+            is_disconnected=lambda: client_disconnected(environ)
+        )
+        try:
+            with deadline_scope(deadline), track_models(), prefetcher.interactive():
+                return view(*args, **kwargs)
+        except DeadlineExceeded as e:
+            print(f"Cancelled {request.path}: {str(e)}")
+            return jsonify({"error": str(e)}), 504
+    return wrapper
+
+def wants_refresh(data=None):
+    """Clients can bypass stored artifacts with ?refresh=true or "refresh": true"""
+    if request.args.get('refresh', '').lower() == 'true':
+        return True
+    return bool(data and data.get('refresh'))
+
+def find_artifact(kind, input_key, data=None):
+    """Return the stored response for this input, unless a refresh was requested"""
+    if wants_refresh(data):
+        return None
+    artifact = artifact_store.latest(kind, input_key)
+    if artifact is None:
+        # A background prefetch of this artifact may be about to finish
+        deadline = current_deadline()
+        if not prefetcher.wait(kind, input_key, deadline.remaining() / 2 if deadline else REQUEST_TIMEOUT_SECONDS / 2):
+            return None
+        artifact = artifact_store.latest(kind, input_key)
+        if artifact is None:
+            return None
+    response = jsonify(artifact["payload"])
+    response.headers['X-Artifact-Id'] = str(artifact["id"])
+    response.headers['X-Artifact-Cached'] = 'true'
+    return response
+
+def routed_model():
+    """Models the current request was routed to, for artifact bookkeeping"""
+    models = current_models()
+    return ",".join(models) if models else None
+
+def store_artifact(kind, input_key, model, payload):
+    """Persist a generated result and return it as a JSON response"""
+    response = jsonify(payload)
+    artifact_id = artifact_store.save(kind, input_key, model, payload)
+    if artifact_id is not None:
+        response.headers['X-Artifact-Id'] = str(artifact_id)
+    return response
+
+def visual_content_key(notes_content):
+    return hashlib.sha256(notes_content.encode('utf-8')).hexdigest()
+
+def prefetch_visual(notes):
+    """Most users visualize their notes next, so render the diagram ahead of time.
+    The content is built the same way GetNotes.jsx builds it, so the keys match."""
+    notes_content = notes[:NOTES_VISUAL_PREFIX_CHARS]
+    heading = re.search(r'<h[1-3][^>]*>(.*?)</h[1-3]>', notes, re.IGNORECASE)
+    if heading and heading.group(1):
+        notes_content = f"{heading.group(1)} - {notes_content}"
+    notes_content = notes_content[:VISUAL_CONTENT_LIMIT]
+
+    def compute():
+        image_data, error = generate_image_from_notes(notes_content)
+        # Text fallbacks mean the image models were unavailable; not worth keeping
+        return None if error or image_data.get("is_text") else image_data
+
+    prefetcher.submit('image', visual_content_key(notes_content), compute)
+
+def prefetch_questions(file_hash, file_content, file_name):
+    """Question banks are a common follow-up to a document summary"""
+    def compute():
+        result = generate_questions_from_text(file_content, file_name)
+        return None if "error" in result else result
+
+    prefetcher.submit('question_bank', file_hash, compute)
+
 @app.route('/api/generate-notes', methods=['POST'])
+@with_deadline
 def generate_notes():
     data = request.json
     youtube_url = data.get('youtube_url')
@@ -65,12 +219,23 @@ def generate_notes():
     if not youtube_url:
         return jsonify({"error": "Missing youtube_url parameter"}), 400
     try:
-        notes = generate_educational_notes(youtube_url)
-        return jsonify({"notes": notes})
+        video_id = extract_video_id(youtube_url)
+        if video_id:
+            stored = find_artifact('notes', video_id, data)
+            if stored is not None:
+                return stored
+        notes, complete = generate_educational_notes_with_status(youtube_url)
+        # Errors and degraded notes (no transcript, missing sections) are not
+        # stored, so the next request retries instead of being served them
+        if not video_id or not complete:
+            return jsonify({"notes": notes})
+        prefetch_visual(notes)
+        return store_artifact('notes', video_id, routed_model(), {"notes": notes})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/analyze-document', methods=['POST'])
+@with_deadline
 def analyze_document():
     if 'file' not in request.files:
         return jsonify({"error": "No file part in the request"}), 400
@@ -79,27 +244,30 @@ def analyze_document():
     
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
-    temp_dir = tempfile.mkdtemp()
-    temp_file_path = os.path.join(temp_dir, file.filename)
     
     try:
-        file.save(temp_file_path)
-        file_content = extract_text_from_file(temp_file_path, file.content_type)
-        result = analyze_document_content(file_content, file.filename)
-        os.remove(temp_file_path)
-        os.rmdir(temp_dir)
-        return jsonify(result)
+        saved = save_upload(file, request.content_length)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    
+    try:
+        stored = find_artifact('summary', saved.sha256)
+        if stored is not None:
+            return stored
+        file_content = extract_text_from_file(saved.path, saved.content_type)
+        result = analyze_document_content(file_content, saved.filename)
+        if "error" in result:
+            return jsonify(result)
+        prefetch_questions(saved.sha256, file_content, saved.filename)
+        return store_artifact('summary', saved.sha256, routed_model(), result)
         
     except Exception as e:
-        # Clean up in case of error
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        if os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
-        
         return jsonify({"error": f"Error processing file: {str(e)}"}), 500
+    finally:
+        remove_upload(saved)
 
 @app.route('/api/generate-roadmap', methods=['POST'])
+@with_deadline
 def generate_roadmap():
     data = request.json
     topic = data.get('topic')
@@ -108,13 +276,20 @@ def generate_roadmap():
         return jsonify({"error": "Missing topic parameter"}), 400
     
     try:
+        topic_key = topic.strip().lower()
+        stored = find_artifact('roadmap', topic_key, data)
+        if stored is not None:
+            return stored
         roadmap_generator = DynamicLearningRoadmapGenerator()
         roadmap = roadmap_generator.generate_comprehensive_roadmap(topic)
-        return jsonify(roadmap)
+        if "error" in roadmap:
+            return jsonify(roadmap)
+        return store_artifact('roadmap', topic_key, routed_model(), roadmap)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/generate-questions', methods=['POST'])
+@with_deadline
 def generate_questions():
     try:
         if 'file' not in request.files:
@@ -122,17 +297,27 @@ def generate_questions():
         file = request.files['file']
         if file.filename == '':
             return jsonify({"error": "No selected file"}), 400
-        temp_dir = tempfile.mkdtemp()
-        temp_path = os.path.join(temp_dir, file.filename)
-        file.save(temp_path)
-        result = generate_question_bank(temp_path, file.content_type, file.filename)
-        os.remove(temp_path)
-        os.rmdir(temp_dir)
-        return jsonify(result)
+        saved = save_upload(file, request.content_length)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    
+    try:
+        stored = find_artifact('question_bank', saved.sha256)
+        if stored is not None:
+            return stored
+        result = generate_question_bank(saved.path, saved.content_type, saved.filename)
+        if "error" in result:
+            return jsonify(result)
+        return store_artifact('question_bank', saved.sha256, routed_model(), result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        remove_upload(saved)
 
 @app.route('/api/generate-visual', methods=['POST'])
+@with_deadline
 def generate_visual():
     try:
         data = request.get_json()
@@ -143,9 +328,14 @@ def generate_visual():
         notes_content = data['notes_content']
         
         # Limit content length to avoid overwhelming the API
-        if len(notes_content) > 1000:
-            print(f"Truncating long content from {len(notes_content)} to 1000 chars")
-            notes_content = notes_content[:1000]
+        if len(notes_content) > VISUAL_CONTENT_LIMIT:
+            print(f"Truncating long content from {len(notes_content)} to {VISUAL_CONTENT_LIMIT} chars")
+            notes_content = notes_content[:VISUAL_CONTENT_LIMIT]
+        
+        content_key = visual_content_key(notes_content)
+        stored = find_artifact('image', content_key, data)
+        if stored is not None:
+            return stored
         
         image_data, error = generate_image_from_notes(notes_content)
         
@@ -153,12 +343,92 @@ def generate_visual():
             print(f"Error generating visual: {error}")
             return jsonify({"error": error}), 500
         
+        if image_data.get("is_text"):
+            # A text fallback from an image-model outage is not stored, so the next request retries
+            return jsonify(image_data), 200
+
         print("Successfully generated visual")
-        return jsonify(image_data), 200
+        return store_artifact('image', content_key, image_data.get("model"), image_data), 200
     except Exception as e:
         print(f"Unexpected error in generate_visual endpoint: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/artifacts', methods=['GET'])
+@require_admin_token
+def artifact_history():
+    kind = request.args.get('kind')
+    if kind and kind not in ARTIFACT_KINDS:
+        return jsonify({"error": f"Unknown artifact kind: {kind}"}), 400
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
+    return jsonify(artifact_store.history(kind, request.args.get('key'), page, per_page))
+
+# Lookups are content-addressed: callers can only fetch artifacts for inputs they already hold
+@app.route('/api/artifacts/lookup', methods=['GET'])
+def artifact_lookup():
+    kind = request.args.get('kind')
+    key = request.args.get('key')
+    if kind not in ARTIFACT_KINDS or not key:
+        return jsonify({"error": "Valid kind and key parameters are required"}), 400
+    artifact = artifact_store.latest(kind, key)
+    if artifact is None:
+        return jsonify({"error": "Artifact not found"}), 404
+    return jsonify(artifact)
+
+@app.route('/api/artifacts/<int:artifact_id>', methods=['GET'])
+@require_admin_token
+def artifact_detail(artifact_id):
+    artifact = artifact_store.get(artifact_id)
+    if artifact is None:
+        return jsonify({"error": "Artifact not found"}), 404
+    return jsonify(artifact)
+
+@app.route('/api/model-stats', methods=['GET'])
+def model_stats():
+    return jsonify(model_router.stats())
+
+@app.route('/api/profiles', methods=['GET'])
+@require_profiling_token
+def list_profiles():
+    profiles = [
+        {key: value for key, value in entry.items() if key != 'path'}
+        for entry in profile_store.list()
+    ]
+    return jsonify({"profiles": profiles})
+
+@app.route('/api/profiles/hot', methods=['GET'])
+@require_profiling_token
+def hot_functions():
+    sort = request.args.get('sort', 'tottime')
+    limit = request.args.get('limit', 30, type=int)
+    return jsonify(profile_store.hot_functions(limit, sort))
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+@require_profiling_token
+def get_profile(profile_id):
+    entry = profile_store.find(profile_id)
+    if entry is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if entry["mode"] == 'cprofile' and request.args.get('format') == 'json':
+        sort = request.args.get('sort', 'cumtime')
+        limit = request.args.get('limit', 30, type=int)
+        stats = pstats.Stats(entry["path"])
+        return jsonify({"id": profile_id, "functions": summarize_stats(stats, limit, sort)})
+    return send_file(os.path.abspath(entry["path"]), as_attachment=True)
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    stats = get_cache_stats()
+    stats["prefetcher"] = prefetcher.stats()
+    return jsonify(stats)
+
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({"error": f"File too large: uploads are limited to {MAX_UPLOAD_SIZE // (1024 * 1024)} MB"}), 413
+
 # Add a global after_request handler to ensure CORS headers
 @app.after_request
 def after_request(response):
@@ -172,10 +442,12 @@ def after_request(response):
             response.headers.add('Access-Control-Allow-Origin', origin)
     
     # Add other CORS headers
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', ','.join(ALLOWED_HEADERS))
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
     response.headers.add('Access-Control-Allow-Credentials', 'false')
-    return response
+    
+    # Compress large payloads and add validators for conditional requests
+    return finalize_response(request, response)
 
 if __name__ == '__main__':
     app.run(debug=os.getenv("DEBUG", "True").lower() == "true", 
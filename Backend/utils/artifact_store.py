@@ -0,0 +1,206 @@
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+ARTIFACT_DB_PATH = os.getenv("ARTIFACT_DB_PATH", "artifacts.db")
+# Artifacts older than this are removed during compaction (0 keeps everything)
+ARTIFACT_MAX_AGE_DAYS = int(os.getenv("ARTIFACT_MAX_AGE_DAYS", 30))
+# Number of versions kept per (kind, input key) during compaction
+ARTIFACT_KEEP_PER_KEY = int(os.getenv("ARTIFACT_KEEP_PER_KEY", 3))
+# Compaction runs at startup and then after this many saves
+ARTIFACT_COMPACT_EVERY = int(os.getenv("ARTIFACT_COMPACT_EVERY", 200))
+
+ARTIFACT_KINDS = ('notes', 'summary', 'question_bank', 'roadmap', 'image')
+
+# Browsing the history (and reading artifacts by id) needs this token, since it
+# exposes every user's artifacts; the endpoints are disabled while it is unset
+ARTIFACT_ADMIN_TOKEN = os.getenv("ARTIFACT_ADMIN_TOKEN", "")
+
+def history_enabled() -> bool:
+    return bool(ARTIFACT_ADMIN_TOKEN)
+
+def is_admin_request(headers) -> bool:
+    """Check the admin token sent as 'Authorization: Bearer <token>' or X-Admin-Token"""
+    if not ARTIFACT_ADMIN_TOKEN:
+        return False
+    token = headers.get('X-Admin-Token', '')
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    return hmac.compare_digest(token.encode(), ARTIFACT_ADMIN_TOKEN.encode())
+
+class ArtifactStore:
+    """SQLite-backed store of generated artifacts, indexed by kind, input key,
+    model and creation time."""
+
+    def __init__(self, db_path: str = ARTIFACT_DB_PATH):
+        self._lock = threading.Lock()
+        self._saves_since_compaction = 0
+        self._db = None
+        if not db_path:
+            return
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS artifacts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    input_key TEXT NOT NULL,
+                    model TEXT,
+                    created_at REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    payload TEXT NOT NULL
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_artifacts_lookup ON artifacts (kind, input_key, created_at DESC)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts (created_at DESC)"
+            )
+            self._db.commit()
+            self.compact()
+        except sqlite3.Error as e:
+            print(f"Artifact store disabled: {str(e)}")
+            self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def save(self, kind: str, input_key: str, model: Optional[str], payload: Any) -> Optional[int]:
+        """Persist a generated artifact and return its id"""
+        if self._db is None:
+            return None
+        data = json.dumps(payload)
+        with self._lock:
+            try:
+                cursor = self._db.execute(
+                    "INSERT INTO artifacts (kind, input_key, model, created_at, size, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, input_key, model, time.time(), len(data), data)
+                )
+                self._db.commit()
+                artifact_id = cursor.lastrowid
+            except sqlite3.Error as e:
+                print(f"Error saving {kind} artifact: {str(e)}")
+                return None
+            self._saves_since_compaction += 1
+            due = self._saves_since_compaction >= ARTIFACT_COMPACT_EVERY
+        if due:
+            self.compact()
+        return artifact_id
+
+    def latest(self, kind: str, input_key: str) -> Optional[Dict[str, Any]]:
+        """Return the newest artifact of `kind` generated for `input_key`"""
+        return self._fetch_one(
+            "SELECT * FROM artifacts WHERE kind = ? AND input_key = ? ORDER BY created_at DESC LIMIT 1",
+            (kind, input_key)
+        )
+
+    def get(self, artifact_id: int) -> Optional[Dict[str, Any]]:
+        """Return a single artifact by id"""
+        return self._fetch_one("SELECT * FROM artifacts WHERE id = ?", (artifact_id,))
+
+    def _fetch_one(self, query, params) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return None
+        with self._lock:
+            try:
+                row = self._db.execute(query, params).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading artifact store: {str(e)}")
+                return None
+        if row is None:
+            return None
+        artifact = self._describe(row)
+        artifact["payload"] = json.loads(row["payload"])
+        return artifact
+
+    @staticmethod
+    def _describe(row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "input_key": row["input_key"],
+            "model": row["model"],
+            "created_at": row["created_at"],
+            "size": row["size"]
+        }
+
+    def history(self, kind: Optional[str] = None, input_key: Optional[str] = None,
+                page: int = 1, per_page: int = 20) -> Dict[str, Any]:
+        """Paginated artifact metadata, newest first. Payloads are not included."""
+        page = max(page, 1)
+        per_page = min(max(per_page, 1), 100)
+        conditions = []
+        params = []
+        if kind:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if input_key:
+            conditions.append("input_key = ?")
+            params.append(input_key)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        result = {"items": [], "page": page, "per_page": per_page, "total": 0}
+        if self._db is None:
+            return result
+        with self._lock:
+            try:
+                result["total"] = self._db.execute(
+                    f"SELECT COUNT(*) FROM artifacts {where}", params
+                ).fetchone()[0]
+                rows = self._db.execute(
+                    f"SELECT id, kind, input_key, model, created_at, size FROM artifacts {where} "
+                    "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                    params + [per_page, (page - 1) * per_page]
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading artifact history: {str(e)}")
+                return result
+        result["items"] = [self._describe(row) for row in rows]
+        return result
+
+    def compact(self, max_age_days: int = ARTIFACT_MAX_AGE_DAYS, keep_per_key: int = ARTIFACT_KEEP_PER_KEY) -> int:
+        """Delete expired artifacts and all but the newest `keep_per_key`
+        versions per input. Returns the number of rows removed."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            self._saves_since_compaction = 0
+            try:
+                removed = 0
+                if max_age_days > 0:
+                    removed += self._db.execute(
+                        "DELETE FROM artifacts WHERE created_at < ?",
+                        (time.time() - max_age_days * 86400,)
+                    ).rowcount
+                if keep_per_key > 0:
+                    removed += self._db.execute(
+                        """DELETE FROM artifacts WHERE id IN (
+                            SELECT id FROM (
+                                SELECT id, ROW_NUMBER() OVER (
+                                    PARTITION BY kind, input_key ORDER BY created_at DESC
+                                ) AS version
+                                FROM artifacts
+                            ) WHERE version > ?
+                        )""",
+                        (keep_per_key,)
+                    ).rowcount
+                self._db.commit()
+                return removed
+            except sqlite3.Error as e:
+                print(f"Error compacting artifact store: {str(e)}")
+                return 0
+
+artifact_store = ArtifactStore()
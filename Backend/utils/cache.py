@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Path of the SQLite file backing the caches; leave empty to keep caches in memory only
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+
+CacheEntry = namedtuple("CacheEntry", ["value", "negative"])
+
+class TieredCache:
+    """Two-tier key/value cache: an in-memory LRU in front of an optional SQLite table.
+
+    Entries expire after `ttl` seconds. Negative entries record that a lookup
+    is known to fail (e.g. no transcript exists) and use the shorter
+    `negative_ttl`. Values must be JSON serialisable."""
+
+    def __init__(self, name: str, maxsize: int = 256, ttl: int = 24 * 3600,
+                 negative_ttl: int = 3600, db_path: Optional[str] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._db = None
+        db_path = CACHE_DB_PATH if db_path is None else db_path
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT,
+                    negative INTEGER NOT NULL DEFAULT 0,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )"""
+            )
+            self._db.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                (self.name, time.time())
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Disabling on-disk {self.name} cache: {str(e)}")
+            self._db = None
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Return the cached entry for `key`, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                expires_at, entry = item
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._hits += 1
+                    self._memory_hits += 1
+                    return entry
+                del self._memory[key]
+
+            entry = self._get_from_db(key, now)
+            if entry is not None:
+                self._hits += 1
+                self._disk_hits += 1
+                return entry
+
+            self._misses += 1
+            return None
+
+    def _get_from_db(self, key: str, now: float) -> Optional[CacheEntry]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, negative, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.name, key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, negative, expires_at = row
+            if expires_at <= now:
+                self._db.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.name, key)
+                )
+                self._db.commit()
+                return None
+            entry = CacheEntry(json.loads(value), bool(negative))
+            self._remember(key, entry, expires_at)
+            return entry
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Error reading {self.name} cache: {str(e)}")
+            return None
+
+    def _remember(self, key: str, entry: CacheEntry, expires_at: float):
+        self._memory[key] = (expires_at, entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Cache a successful lookup"""
+        self._store(key, CacheEntry(value, False), self.ttl if ttl is None else ttl)
+
+    def set_negative(self, key: str, reason: Any = None, ttl: Optional[int] = None):
+        """Cache a lookup that is known to fail"""
+        self._store(key, CacheEntry(reason, True), self.negative_ttl if ttl is None else ttl)
+
+    def _store(self, key: str, entry: CacheEntry, ttl: int):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, entry, expires_at)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, negative, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (self.name, key, json.dumps(entry.value), int(entry.negative), expires_at)
+                )
+                self._db.commit()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print(f"Error writing {self.name} cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and size counters for monitoring"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            disk_size = None
+            if self._db is not None:
+                try:
+                    disk_size = self._db.execute(
+                        "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?",
+                        (self.name,)
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            return {
+                "hits": self._hits,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "memory_size": len(self._memory),
+                "memory_maxsize": self.maxsize,
+                "disk_size": disk_size
+            }
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import os
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Load environment variables
+load_dotenv()
+
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'text/',
+    'application/javascript',
+    'image/svg+xml'
+)
+
+def choose_encoding(request):
+    """Pick the best content coding the client accepts: br, then gzip, else None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def finalize_response(request, response):
+    """Add a strong ETag, answer matching conditional GETs with 304, and compress the body.
+
+    Each content coding gets its own ETag (suffixed with the coding) so the
+    validator stays strong across compressed and identity representations."""
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers:
+        return response
+
+    data = response.get_data()
+    mimetype = response.mimetype or ''
+    encoding = None
+    if len(data) >= COMPRESSION_MIN_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+        encoding = choose_encoding(request)
+        response.vary.add('Accept-Encoding')
+
+    etag = hashlib.sha256(data).hexdigest()[:32]
+    if encoding:
+        etag = f"{etag}-{encoding}"
+    response.set_etag(etag)
+
+    if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(etag):
+        response.status_code = 304
+        response.set_data(b'')
+        response.headers.pop('Content-Type', None)
+        response.headers.pop('Content-Length', None)
+        return response
+
+    if encoding:
+        response.set_data(_compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+
+    return response
@@ -0,0 +1,102 @@
+import contextvars
+import os
+import select
+import socket
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", 120))
+# Upper bound for deadlines requested by clients through the X-Request-Timeout header
+MAX_REQUEST_TIMEOUT_SECONDS = float(os.getenv("MAX_REQUEST_TIMEOUT_SECONDS", 300))
+
+class DeadlineExceeded(BaseException):
+    """Raised when a request runs past its deadline or its client goes away.
+
+    Like asyncio.CancelledError this derives from BaseException, so the broad
+    `except Exception` fallbacks in the generators do not swallow it and move
+    on to the next (equally doomed) model call."""
+
+class Deadline:
+    """Absolute point in time by which a request must finish"""
+
+    def __init__(self, seconds: float, is_disconnected: Optional[Callable[[], bool]] = None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self._is_disconnected = is_disconnected
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if the deadline passed or the client disconnected"""
+        if time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded(f"Request deadline of {self.seconds:g}s exceeded before {stage}")
+        if self._is_disconnected is not None and self._is_disconnected():
+            raise DeadlineExceeded(f"Client disconnected before {stage}")
+
+_current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make `deadline` the current deadline, e.g. inside a worker thread"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def check_deadline(stage: str):
+    """Cancellation point: no-op when no deadline is active"""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+def time_left(default: float) -> float:
+    """Seconds the next blocking call may take: `default`, capped by the deadline"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    return max(0.001, min(default, deadline.remaining()))
+
+def request_options() -> Dict[str, float]:
+    """request_options for generate_content so a model call cannot outlive the deadline"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return {}
+    return {"timeout": max(1.0, deadline.remaining())}
+
+def parse_timeout(value: Optional[str]) -> float:
+    """Deadline in seconds from a client supplied value, falling back to the configured default"""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return REQUEST_TIMEOUT_SECONDS
+    return min(max(seconds, 1.0), MAX_REQUEST_TIMEOUT_SECONDS)
+
+def client_disconnected(environ) -> bool:
+    """Best-effort check whether the client closed its connection.
+
+    Works with servers that expose the client socket in the WSGI environ
+    (Werkzeug's dev server and gunicorn). Once the request body has been
+    read, a readable socket that returns no data means the peer hung up."""
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except ValueError:
+        # TLS sockets do not support peeking
+        return False
+    except OSError:
+        return True
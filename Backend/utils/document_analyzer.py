@@ -1,16 +1,20 @@
 import os
 import tempfile
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig, HarmCategory, HarmBlockThreshold
+from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import PyPDF2
-import docx
 import pandas as pd
 from utils.gemini import configure_gemini_api
+from utils.deadline import check_deadline
+from utils.docx_reader import read_docx_text
+from utils.model_router import model_router
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Character budget for text extracted from Word documents (0 = no limit)
+DOCX_MAX_CHARS = int(os.getenv("DOCX_MAX_CHARS", 1000000))
+
 def extract_text_from_pdf(file_path):
     """Extract text from a PDF file"""
     text = ""
@@ -18,20 +22,17 @@ def extract_text_from_pdf(file_path):
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             for page_num in range(len(pdf_reader.pages)):
+                check_deadline(f"PDF page {page_num + 1} extraction")
                 page = pdf_reader.pages[page_num]
                 text += page.extract_text() + "\n\n"
         return text
     except Exception as e:
         return f"Error extracting text from PDF: {str(e)}"
 
-def extract_text_from_docx(file_path):
-    """Extract text from a Word document"""
-    text = ""
+def extract_text_from_docx(file_path, max_chars=DOCX_MAX_CHARS):
+    """Extract paragraphs, headings and tables from a Word document"""
     try:
-        doc = docx.Document(file_path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        return text
+        return read_docx_text(file_path, max_chars)
     except Exception as e:
         return f"Error extracting text from Word document: {str(e)}"
 
@@ -59,6 +60,7 @@ def extract_text_from_txt(file_path):
 
 def extract_text_from_file(file_path, file_type):
     """Extract text from a file based on its type"""
+    check_deadline("text extraction")
     if file_type == 'application/pdf':
         return extract_text_from_pdf(file_path)
     elif file_type in ['application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document']:
@@ -77,21 +79,12 @@ def analyze_document_content(file_content, file_name):
         return {"error": f"API Configuration Error: {error_message}"}
     
     try:  
-        generation_config = GenerationConfig(
-            temperature=0.2,
-            top_p=0.95,
-            top_k=40,
-            max_output_tokens=4096
-        )
-        
         safety_settings = {
             HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
             HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
         }
         
-        model = genai.GenerativeModel('gemini-2.0-flash-exp-image-generation')
-        
         prompt = f"""
         Create a comprehensive summary and analysis of the following document content:
         
@@ -111,10 +104,13 @@ def analyze_document_content(file_content, file_name):
         8. don't add any other text except the summary like "Okay here is the summary" or anything like that
         """
         
-        response = model.generate_content(
+        response = model_router.generate(
+            "summary",
             prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
+            safety_settings=safety_settings,
+            temperature=0.2,
+            top_p=0.95,
+            top_k=40
         )
         
         if response.text:
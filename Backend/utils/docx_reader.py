@@ -0,0 +1,150 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Iterator
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+P = W_NS + 'p'
+T = W_NS + 't'
+TAB = W_NS + 'tab'
+BR = W_NS + 'br'
+BODY = W_NS + 'body'
+CR = W_NS + 'cr'
+TBL = W_NS + 'tbl'
+TR = W_NS + 'tr'
+TC = W_NS + 'tc'
+PPR = W_NS + 'pPr'
+PSTYLE = W_NS + 'pStyle'
+NUMPR = W_NS + 'numPr'
+VAL = W_NS + 'val'
+
+HEADING_STYLE = re.compile(r'^heading\s*([1-6])$', re.IGNORECASE)
+
+def _paragraph_text(paragraph) -> str:
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == T:
+            parts.append(node.text or '')
+        elif node.tag == TAB:
+            parts.append('\t')
+        elif node.tag in (BR, CR):
+            parts.append('\n')
+    return ''.join(parts).strip()
+
+def _paragraph_prefix(paragraph) -> str:
+    """Markdown prefix for headings and list items, based on the paragraph properties"""
+    properties = paragraph.find(PPR)
+    if properties is None:
+        return ''
+    style = properties.find(PSTYLE)
+    if style is not None:
+        style_id = style.get(VAL, '')
+        match = HEADING_STYLE.match(style_id)
+        if match:
+            return '#' * int(match.group(1)) + ' '
+        if style_id.lower() == 'title':
+            return '# '
+    if properties.find(NUMPR) is not None:
+        return '* '
+    return ''
+
+def _detach(parent, elem):
+    """Free an element and detach it from its parent so the parsed tree does not grow.
+
+    Children are released in document order, so the element is normally the
+    first child still attached (iterparse may already have appended the
+    siblings that follow it)."""
+    elem.clear()
+    if parent is None:
+        return
+    if len(parent) and parent[0] is elem:
+        del parent[0]
+    else:
+        try:
+            parent.remove(elem)
+        except ValueError:
+            pass
+
+def iter_docx_blocks(file_path: str) -> Iterator[str]:
+    """Yield the paragraphs, headings and table rows of a .docx file in document order.
+
+    word/document.xml is read as a stream with iterparse. Every paragraph outside
+    a table, every row of a top-level table and every direct child of <w:body>
+    (including ones that yield no text, such as bookmarks) is released once it
+    ends, so memory stays flat for long documents and long tables alike, also
+    inside wrappers such as <w:sdt> (tables of contents) and <w:customXml>.
+    Headings and list items get Markdown prefixes; table rows are emitted as
+    Markdown table lines."""
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open('word/document.xml') as document:
+            # Open elements from the root down, to find each element's parent
+            stack = []
+            body_depth = None
+            table_depth = 0
+            rows = []
+            cells = []
+            for event, elem in ET.iterparse(document, events=('start', 'end')):
+                tag = elem.tag
+                if event == 'start':
+                    stack.append(elem)
+                    if tag == BODY:
+                        body_depth = len(stack)
+                    elif tag == TBL:
+                        table_depth += 1
+                    elif tag == TR:
+                        rows.append([])
+                    elif tag == TC:
+                        cells.append([])
+                    continue
+
+                stack.pop()
+                parent = stack[-1] if stack else None
+
+                if tag == P:
+                    text = _paragraph_text(elem)
+                    if cells:
+                        if text:
+                            cells[-1].append(text)
+                    elif text:
+                        yield _paragraph_prefix(elem) + text
+                elif tag == TC:
+                    cell = ' '.join(cells.pop()).replace('|', '\\|').replace('\n', ' ')
+                    if rows:
+                        rows[-1].append(cell)
+                elif tag == TR:
+                    row = rows.pop()
+                    if any(row):
+                        if cells:
+                            # Nested table: fold the row into the enclosing cell
+                            cells[-1].append(' / '.join(c for c in row if c))
+                        else:
+                            yield '| ' + ' | '.join(row) + ' |'
+                    if table_depth == 1:
+                        _detach(parent, elem)
+                elif tag == TBL:
+                    table_depth -= 1
+                    if table_depth == 0:
+                        yield ''
+
+                if body_depth is None or table_depth:
+                    continue
+                # Paragraphs are freed as soon as they are read, whatever wraps them
+                if tag == P or len(stack) == body_depth:
+                    _detach(parent, elem)
+
+def read_docx_text(file_path: str, max_chars: int = 0) -> str:
+    """Join the blocks of a .docx file, stopping once `max_chars` is reached (0 = no limit)"""
+    parts = []
+    total = 0
+    blocks = iter_docx_blocks(file_path)
+    try:
+        for block in blocks:
+            if max_chars and total + len(block) > max_chars:
+                parts.append(block[:max(0, max_chars - total)])
+                parts.append("[Content truncated]")
+                break
+            parts.append(block)
+            total += len(block) + 1
+    finally:
+        blocks.close()
+    return '\n'.join(parts)
@@ -1,17 +1,46 @@
 import re
 import base64
 import os
-from typing import Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple, List
 import google.generativeai as genai
-from google.generativeai.types import GenerationConfig, HarmCategory, HarmBlockThreshold
+from google.generativeai.types import HarmCategory, HarmBlockThreshold
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-import requests
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from utils.cache import TieredCache
+from utils.http_client import fetch_head_meta
+from utils.deadline import check_deadline, current_deadline, deadline_scope, request_options
+from utils.model_router import model_router, current_models, track_models, is_truncated
+from utils.profiler import current_profile, profile_scope
 
 # Load environment variables
 load_dotenv()
 
+# Image-capable model; text-only prompts go through utils.model_router instead
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", 'gemini-2.0-flash-exp-image-generation')
+
+# Long transcripts are split into windows of roughly this many seconds
+TRANSCRIPT_CHUNK_SECONDS = int(os.getenv("TRANSCRIPT_CHUNK_SECONDS", 600))
+# Number of transcript chunks summarised in parallel
+NOTES_MAX_WORKERS = int(os.getenv("NOTES_MAX_WORKERS", 4))
+
+SENTENCE_ENDINGS = ('.', '?', '!')
+
+TRANSCRIPT_LANGUAGES = tuple(os.getenv("TRANSCRIPT_LANGUAGES", "en").split(","))
+
+# Transcripts and metadata of popular videos are requested repeatedly
+transcript_cache = TieredCache(
+    "transcripts",
+    maxsize=int(os.getenv("TRANSCRIPT_CACHE_SIZE", 256)),
+    ttl=int(os.getenv("TRANSCRIPT_CACHE_TTL", 7 * 24 * 3600)),
+    negative_ttl=int(os.getenv("TRANSCRIPT_NEGATIVE_CACHE_TTL", 3600))
+)
+video_info_cache = TieredCache(
+    "video_info",
+    maxsize=int(os.getenv("VIDEO_INFO_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("VIDEO_INFO_CACHE_TTL", 6 * 3600))
+)
+
 def validate_youtube_url(url: str) -> bool:
     youtube_regex = r'^(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})($|&|\?)'
     match = re.match(youtube_regex, url)
@@ -27,37 +56,105 @@ def extract_video_id(url: str) -> Optional[str]:
 
 def get_video_info(video_id: str) -> Dict[str, str]:
     """Get video title and description when transcript is not available"""
+    cached = video_info_cache.get(video_id)
+    if cached is not None:
+        return cached.value
     try:
         url = f"https://www.youtube.com/watch?v={video_id}"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        title = soup.find('meta', property='og:title')
-        title = title['content'] if title else "Unknown Title"
-        description = soup.find('meta', property='og:description')
-        description = description['content'] if description else "No description available."
-        
-        return {
-            "title": title,
-            "description": description
+        meta = fetch_head_meta(url)
+        video_info = {
+            "title": meta.get('og:title') or "Unknown Title",
+            "description": meta.get('og:description') or "No description available."
         }
+        video_info_cache.set(video_id, video_info)
+        return video_info
     except Exception as e:
         return {
             "title": "Video Information Unavailable",
             "description": f"Error retrieving video info: {str(e)}"
         }
 
-def get_video_transcript(video_id: str) -> Tuple[str, bool]:
-    """Get video transcript using YouTube Transcript API"""
+def get_transcript_segments(video_id: str, languages: Tuple[str, ...] = TRANSCRIPT_LANGUAGES) -> Optional[List[Dict[str, Any]]]:
+    """Get the raw transcript segments (text, start, duration) for a video.
+
+    Returns None when the video has no transcript in the requested languages.
+    Both outcomes are cached per video_id and language."""
+    cache_key = f"{video_id}:{','.join(languages)}"
+    cached = transcript_cache.get(cache_key)
+    if cached is not None:
+        return None if cached.negative else cached.value
+    check_deadline("transcript fetch")
     try:
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-        transcript_text = " ".join([item['text'] for item in transcript_list])
-        return transcript_text, True
-    except (TranscriptsDisabled, NoTranscriptFound):
+        segments = YouTubeTranscriptApi.get_transcript(video_id, languages=languages)
+    except (TranscriptsDisabled, NoTranscriptFound) as e:
+        transcript_cache.set_negative(cache_key, type(e).__name__)
+        return None
+    transcript_cache.set(cache_key, segments)
+    return segments
+
+def get_video_transcript(video_id: str) -> Tuple[Any, bool]:
+    """Get video transcript using YouTube Transcript API.
+
+    Returns the list of timed transcript segments when a transcript is
+    available, otherwise a fallback text built from the video metadata."""
+    try:
+        segments = get_transcript_segments(video_id)
+    except Exception as e:
+        return f"Error retrieving content: {str(e)}", False
+    # An empty transcript carries no content; treat it like a missing one
+    if not segments or not any(segment.get('text', '').strip() for segment in segments):
         video_info = get_video_info(video_id)
         fallback_text = f"Title: {video_info['title']}\n\nDescription: {video_info['description']}"
         return fallback_text, False
-    except Exception as e:
-        return f"Error retrieving content: {str(e)}", False
+    return segments, True
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit ratio and size of the transcript and metadata caches"""
+    return {
+        "transcripts": transcript_cache.stats(),
+        "video_info": video_info_cache.stats()
+    }
+
+def format_timestamp(seconds: float) -> str:
+    """Format a number of seconds as H:MM:SS (or MM:SS for short videos)"""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+def chunk_transcript(segments: List[Dict[str, Any]], window_seconds: int = TRANSCRIPT_CHUNK_SECONDS) -> List[Dict[str, Any]]:
+    """Split transcript segments into time windows that end on sentence boundaries.
+
+    A chunk is closed at the first sentence ending after `window_seconds`.
+    Auto-generated captions often have no punctuation, so a chunk is also
+    closed once it runs 50% past the window."""
+    chunks = []
+    texts = []
+    start = None
+    end = 0.0
+
+    def flush():
+        if texts:
+            chunks.append({"start": start, "end": end, "text": " ".join(texts)})
+
+    for segment in segments:
+        text = segment.get('text', '').replace('\n', ' ').strip()
+        if not text:
+            continue
+        if start is None:
+            start = segment['start']
+        texts.append(text)
+        end = segment['start'] + segment.get('duration', 0)
+        elapsed = end - start
+        if (elapsed >= window_seconds and text.endswith(SENTENCE_ENDINGS)) or elapsed >= window_seconds * 1.5:
+            flush()
+            texts = []
+            start = None
+
+    flush()
+    return chunks
 
 def configure_gemini_api():
     """Configure the Gemini API with error handling"""
@@ -70,33 +167,133 @@ def configure_gemini_api():
     except Exception as e:
         return False, str(e)
 
+def _generate_notes_text(endpoint: str, prompt: str) -> Tuple[str, bool]:
+    """Send a notes prompt through the model router.
+    Returns the response text and whether it is complete (not cut off at max_output_tokens)."""
+    safety_settings = {
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+    }
+    response = model_router.generate(
+        endpoint,
+        prompt,
+        safety_settings=safety_settings,
+        temperature=0.2,
+        top_p=0.95,
+        top_k=40
+    )
+    truncated = is_truncated(response)
+    if truncated:
+        print(f"{endpoint} response was cut off at the output token limit")
+    return response.text, not truncated
+
+def _generate_chunk_notes(chunk: Dict[str, Any], video_id: str) -> Tuple[str, bool]:
+    """Map step: generate notes for a single timed transcript chunk.
+    Returns the notes and whether they were generated (False for the placeholder)."""
+    time_range = f"{format_timestamp(chunk['start'])} - {format_timestamp(chunk['end'])}"
+    prompt = f"""
+    Create detailed educational notes for one section of a longer YouTube video TRANSCRIPT:
+    
+    VIDEO ID: {video_id}
+    SECTION TIME RANGE: {time_range}
+    
+    CONTENT:
+    {chunk['text']}
+    
+    INSTRUCTIONS:
+    1. Write the notes in Markdown, starting with a single "## [{time_range}] <section title>" header
+    2. Use ### subheadings, bullet points, and concise paragraphs below that header
+    3. Include all key concepts, definitions, examples, and important points from this section
+    4. Be factual - only include information that can be directly inferred from the provided content
+    5. don't add any other text except the notes like "Okay here are the notes" or anything like that
+    """
+    try:
+        text, complete = _generate_notes_text("notes_section", prompt)
+        if text:
+            return text.strip(), complete
+    except Exception as e:
+        print(f"Notes generation failed for section {time_range}: {str(e)}")
+    return f"## [{time_range}]\n\n_Notes could not be generated for this section._", False
+
+def _merge_chunk_notes(section_notes: List[str], video_id: str, youtube_url: str) -> Tuple[str, bool]:
+    """Reduce step: frame the per-section notes as one document.
+
+    The model only writes the title, overview and key takeaways; the section notes
+    are kept in order as they are, so long videos are not condensed into one
+    response. Returns the notes and whether the framing was generated (False when
+    falling back to the bare sections)."""
+    combined = "\n\n".join(section_notes)
+    prompt = f"""
+    These are the section-by-section notes of a YouTube video:
+    
+    VIDEO ID: {video_id}
+    URL: {youtube_url}
+    
+    SECTION NOTES:
+    {combined}
+    
+    INSTRUCTIONS:
+    1. Write a "# " title and a short overview of the whole video
+    2. Then write a "## Key Takeaways" section with the most important points of the whole video
+    3. Do not repeat or rewrite the section notes; they are kept as they are between the overview and the takeaways
+    4. Use proper Markdown formatting (headers with #, lists with *, etc.)
+    5. don't add any other text except the notes like "Okay here are the notes" or anything like that
+    """
+    try:
+        text, complete = _generate_notes_text("notes_merge", prompt)
+        if text and complete:
+            text = text.strip()
+            overview, marker, takeaways = text.partition("## Key Takeaways")
+            parts = [overview.strip(), combined]
+            if marker:
+                parts.append(marker + takeaways)
+            return "\n\n".join(part for part in parts if part), True
+    except Exception as e:
+        print(f"Merge pass failed, returning section notes: {str(e)}")
+    return combined, False
+
+def generate_chunked_notes(chunks: List[Dict[str, Any]], video_id: str, youtube_url: str) -> Tuple[str, bool]:
+    """Generate notes for each transcript chunk in parallel, then merge them.
+    Returns the notes and whether every section and the merge succeeded."""
+    # Worker threads do not inherit context variables, so hand them over explicitly
+    deadline = current_deadline()
+    used_models = current_models()
+    profile = current_profile()
+
+    def generate_section(chunk):
+        with deadline_scope(deadline), track_models(used_models), profile_scope(profile):
+            return _generate_chunk_notes(chunk, video_id)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(NOTES_MAX_WORKERS, len(chunks)))) as executor:
+        sections = list(executor.map(generate_section, chunks))
+    notes, merged = _merge_chunk_notes([text for text, _ in sections], video_id, youtube_url)
+    return notes, merged and all(ok for _, ok in sections)
+
 def generate_educational_notes(youtube_url: str) -> str:
     """Generate educational notes from a YouTube video using its transcript"""
+    notes, _ = generate_educational_notes_with_status(youtube_url)
+    return notes
+
+def generate_educational_notes_with_status(youtube_url: str) -> Tuple[str, bool]:
+    """Generate educational notes and report whether they are complete: built from
+    the full transcript with every section generated. Error messages, notes built
+    from video metadata only and notes with missing sections are not complete and
+    should not be persisted."""
     video_id = extract_video_id(youtube_url)
     if not video_id:
-        return "Invalid YouTube URL. Please provide a valid YouTube video link."
+        return "Invalid YouTube URL. Please provide a valid YouTube video link.", False
     success, error_message = configure_gemini_api()
     if not success:
-        return f"API Configuration Error: {error_message}"
+        return f"API Configuration Error: {error_message}", False
     content, transcript_available = get_video_transcript(video_id)
-    
-    generation_config = GenerationConfig(
-        temperature=0.2, 
-        top_p=0.95,
-        top_k=40,
-        max_output_tokens=4096 
-    )
-    
-    safety_settings = {
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
-    }
 
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp-image-generation')
-        
         if transcript_available:
+            chunks = chunk_transcript(content)
+            if len(chunks) > 1:
+                return generate_chunked_notes(chunks, video_id, youtube_url)
+            content = " ".join(chunk['text'] for chunk in chunks)
             prompt_source = "TRANSCRIPT"
         else:
             prompt_source = "VIDEO METADATA (NO TRANSCRIPT AVAILABLE)"
@@ -121,19 +318,15 @@ def generate_educational_notes(youtube_url: str) -> str:
         8. don't add any other text except the notes like "Okay here are the notes" or anything like that
         """
 
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
+        text, complete = _generate_notes_text("notes", prompt)
         
-        if response.text:
-            return response.text.strip()
+        if text:
+            return text.strip(), transcript_available and complete
         else:
-            return "Failed to generate educational notes."
+            return "Failed to generate educational notes.", False
 
     except Exception as e:
-        return f"Generation Error: {str(e)}"
+        return f"Generation Error: {str(e)}", False
 
 def generate_context_image(context: str) -> Dict[str, Any]:
     """Generate an image that explains the given context.
@@ -142,7 +335,7 @@ def generate_context_image(context: str) -> Dict[str, Any]:
     if not success:
         return {"error": f"API Configuration Error: {error_message}"}
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp-image-generation')
+        model = genai.GenerativeModel(DEFAULT_MODEL)
         prompt = f"""
         Create a visual explanation for the following educational content:
         {context}
@@ -151,7 +344,8 @@ def generate_context_image(context: str) -> Dict[str, Any]:
         Use appropriate visual elements like diagrams, flowcharts, or illustrations to explain the concepts.
         """
         
-        response = model.generate_content(prompt)
+        check_deadline("context image generation")
+        response = model.generate_content(prompt, request_options=request_options())
 
         text_response = ""
         image_data = None
@@ -0,0 +1,122 @@
+import codecs
+import os
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from utils.deadline import time_left
+
+# Load environment variables
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 5))
+# Upper bound for the whole download, since the read timeout applies per socket read
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", 10))
+# Stop reading a page once this many bytes have arrived without a </head>
+HTTP_MAX_HEAD_BYTES = int(os.getenv("HTTP_MAX_HEAD_BYTES", 512 * 1024))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_RETRY_BACKOFF = 0.3
+# Transient server errors are retried within the total timeout. 429 and 503 mean
+# YouTube is throttling us, so they fail fast instead of retrying into the throttle.
+HTTP_RETRY_STATUSES = (500, 502, 504)
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; Vyasa/1.0)",
+    "Accept": "text/html",
+    "Accept-Language": "en-US,en;q=0.8"
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session() -> requests.Session:
+    """Return the shared, connection-pooled HTTP session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Retries are done by the callers, so they stay within their total timeout
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_SIZE,
+                    pool_maxsize=HTTP_POOL_SIZE,
+                    max_retries=0
+                )
+                session = requests.Session()
+                session.headers.update(DEFAULT_HEADERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+class HeadMetaParser(HTMLParser):
+    """Collects <meta property/name=... content=...> tags until </head> is seen"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'body':
+            self.done = True
+        elif tag == 'meta':
+            attributes = dict(attrs)
+            key = attributes.get('property') or attributes.get('name')
+            content = attributes.get('content')
+            if key and content is not None and key not in self.meta:
+                self.meta[key] = content
+
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self.done = True
+
+def _read_head_meta(session: requests.Session, url: str, deadline: float) -> Dict[str, str]:
+    """One attempt of fetch_head_meta; `deadline` is a time.monotonic() value"""
+    parser = HeadMetaParser()
+    remaining = deadline - time.monotonic()
+    timeouts = (min(time_left(HTTP_CONNECT_TIMEOUT), remaining), min(time_left(HTTP_READ_TIMEOUT), remaining))
+
+    with session.get(url, stream=True, timeout=timeouts) as response:
+        response.raise_for_status()
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        received = 0
+        for chunk in response.iter_content(chunk_size=16 * 1024):
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or received >= HTTP_MAX_HEAD_BYTES:
+                break
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"Timed out reading page head from {url}")
+
+    return parser.meta
+
+def _is_retryable(error: requests.RequestException) -> bool:
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in HTTP_RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+def fetch_head_meta(url: str, timeout: Optional[float] = None) -> Dict[str, str]:
+    """Stream a page and return its <head> meta tags, without downloading the body.
+
+    Connection errors and 500/502/504 responses are retried, but connecting,
+    reading and backing off all share one total timeout. Raises requests
+    exceptions on connection errors, timeouts and bad statuses."""
+    deadline = time.monotonic() + time_left(timeout or HTTP_TOTAL_TIMEOUT)
+    session = get_http_session()
+
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            return _read_head_meta(session, url, deadline)
+        except requests.RequestException as e:
+            backoff = HTTP_RETRY_BACKOFF * (2 ** attempt)
+            if attempt == HTTP_RETRIES or not _is_retryable(e) or time.monotonic() + backoff >= deadline:
+                raise
+            print(f"Retrying {url} after error: {str(e)}")
+            time.sleep(backoff)
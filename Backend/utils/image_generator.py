@@ -4,6 +4,7 @@ import mimetypes
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 from dotenv import load_dotenv
+from utils.deadline import check_deadline, request_options
 
 # Load environment variables
 load_dotenv()
@@ -69,7 +70,8 @@ The diagram should be:
 """
         
         try:
-            response = model.generate_content(prompt)
+            check_deadline("image generation")
+            response = model.generate_content(prompt, request_options=request_options())
             
             print(f"Response type: {type(response)}")
             print(f"Has text attribute: {hasattr(response, 'text')}")
@@ -84,6 +86,7 @@ The diagram should be:
                             if hasattr(part, 'inline_data') and part.inline_data:
                                 return {
                                     "success": True,
+                                    "model": "gemini-2.0-flash-exp-image-generation",
                                     "image_data": base64.b64encode(part.inline_data.data).decode('utf-8'),
                                     "mime_type": part.inline_data.mime_type
                                 }, None
@@ -103,13 +106,14 @@ def generate_alternative_image(notes_content):
     """Alternative approach using the image generation specific model"""
     try:
         # Using original model name
+        check_deadline("alternative image generation")
         print(f"Attempting with imagegeneration@002...")
         model = genai.GenerativeModel("imagegeneration@002")
         
         prompt = f"""Create a detailed educational diagram visualizing: {notes_content}
         Make it clear, labeled, and visually intuitive for education purposes."""
         
-        response = model.generate_content(prompt)
+        response = model.generate_content(prompt, request_options=request_options())
         
         print(f"Alternative response type: {type(response)}")
         print(f"Has candidates: {hasattr(response, 'candidates')}")
@@ -122,6 +126,7 @@ def generate_alternative_image(notes_content):
                         if hasattr(part, 'inline_data') and part.inline_data:
                             return {
                                 "success": True,
+                                "model": "imagegeneration@002",
                                 "image_data": base64.b64encode(part.inline_data.data).decode('utf-8'),
                                 "mime_type": part.inline_data.mime_type
                             }, None
@@ -137,6 +142,7 @@ def generate_backup_image(notes_content):
     """Final backup approach using a different model structure"""
     try:
         # Use original model
+        check_deadline("backup image generation")
         print(f"Attempting backup approach with gemini-1.5-flash...")
         model = genai.GenerativeModel("gemini-1.5-flash")
         
@@ -146,7 +152,7 @@ def generate_backup_image(notes_content):
         
         The diagram should be designed for educational purposes with clear labels and visual elements."""
         
-        response = model.generate_content(prompt)
+        response = model.generate_content(prompt, request_options=request_options())
         
         # Add detailed logging
         print(f"Backup response type: {type(response)}")
@@ -158,6 +164,7 @@ def generate_backup_image(notes_content):
             print("Returning text content as fallback")
             return {
                 "success": True,
+                "model": "gemini-1.5-flash",
                 "is_text": True,
                 "text_content": response.text,
                 "summary": "Educational content generated as text (image generation not supported)"
@@ -166,6 +173,7 @@ def generate_backup_image(notes_content):
         if hasattr(response, 'image') and response.image:
             return {
                 "success": True,
+                "model": "gemini-1.5-flash",
                 "image_data": response.image,
                 "mime_type": "image/png"
             }, None
@@ -177,12 +185,14 @@ def generate_backup_image(notes_content):
                         if hasattr(part, 'inline_data') and part.inline_data and part.inline_data.mime_type.startswith('image/'):
                             return {
                                 "success": True,
+                                "model": "gemini-1.5-flash",
                                 "image_data": base64.b64encode(part.inline_data.data).decode('utf-8'),
                                 "mime_type": part.inline_data.mime_type
                             }, None
                         elif hasattr(part, 'text') and part.text:
                             return {
                                 "success": True,
+                                "model": "gemini-1.5-flash",
                                 "is_text": True,
                                 "text_content": part.text,
                                 "summary": "Educational content generated as text (image generation not supported)"
@@ -0,0 +1,223 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import google.generativeai as genai
+from google.generativeai.types import GenerationConfig
+from dotenv import load_dotenv
+from utils.deadline import check_deadline, current_deadline, request_options
+
+# Load environment variables
+load_dotenv()
+
+# Routing rules, as inline JSON or a path to a JSON file; see DEFAULT_ROUTING_RULES
+MODEL_ROUTING_RULES = os.getenv("MODEL_ROUTING_RULES", "")
+# Number of recent calls per model used for latency and error statistics
+MODEL_STATS_WINDOW = int(os.getenv("MODEL_STATS_WINDOW", 50))
+# Calls needed before a model's statistics influence routing
+MODEL_STATS_MIN_SAMPLES = int(os.getenv("MODEL_STATS_MIN_SAMPLES", 5))
+# Models failing at least this share of recent calls are skipped while alternatives exist
+MODEL_MAX_ERROR_RATE = float(os.getenv("MODEL_MAX_ERROR_RATE", 0.5))
+
+# Rules are tried in order; the first whose endpoints and max_input_tokens match wins.
+# Models are listed in order of preference.
+DEFAULT_ROUTING_RULES = [
+    # The merge pass only writes the title, overview and key takeaways around the section notes
+    {"endpoints": ["notes_merge"], "models": ["gemini-2.0-flash"], "max_output_tokens": 2048},
+    # Roadmap sections list stages and resources at length; keep the model's full output limit
+    {"endpoints": ["roadmap"], "models": ["gemini-2.0-flash", "gemini-2.0-flash-lite"], "max_output_tokens": 8192},
+    {"endpoints": ["notes"], "max_input_tokens": 800, "models": ["gemini-2.0-flash-lite", "gemini-2.0-flash"], "max_output_tokens": 2048},
+    {"max_input_tokens": 4000, "models": ["gemini-2.0-flash-lite", "gemini-2.0-flash"], "max_output_tokens": 4096},
+    {"max_input_tokens": 200000, "models": ["gemini-2.0-flash", "gemini-2.0-flash-lite"], "max_output_tokens": 4096},
+    {"models": ["gemini-2.0-flash"], "max_output_tokens": 8192}
+]
+
+Route = namedtuple("Route", ["endpoint", "model", "max_output_tokens", "input_tokens", "rule"])
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return len(text) // 4 + 1
+
+def is_truncated(response) -> bool:
+    """Whether a response stopped because it reached max_output_tokens"""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return getattr(reason, "name", None) == "MAX_TOKENS" or reason == 2
+
+def load_routing_rules(value: str = MODEL_ROUTING_RULES) -> List[Dict[str, Any]]:
+    """Parse routing rules from inline JSON or a JSON file, falling back to the defaults"""
+    if not value:
+        return DEFAULT_ROUTING_RULES
+    try:
+        if value.lstrip().startswith('['):
+            rules = json.loads(value)
+        else:
+            with open(value, 'r', encoding='utf-8') as file:
+                rules = json.load(file)
+        if not rules or not all(rule.get("models") for rule in rules):
+            raise ValueError("every rule needs a non-empty 'models' list")
+        return rules
+    except Exception as e:
+        print(f"Invalid MODEL_ROUTING_RULES, using defaults: {str(e)}")
+        return DEFAULT_ROUTING_RULES
+
+class ModelStats:
+    """Rolling latency and error statistics for one model"""
+
+    def __init__(self, window: int = MODEL_STATS_WINDOW):
+        self.calls = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool):
+        self.calls.append((latency, ok))
+
+    @property
+    def samples(self) -> int:
+        return len(self.calls)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, ok in self.calls if not ok) / len(self.calls)
+
+    @property
+    def median_latency(self) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self.calls if ok)
+        if not latencies:
+            return None
+        return latencies[len(latencies) // 2]
+
+    def to_dict(self) -> Dict[str, Any]:
+        median = self.median_latency
+        return {
+            "samples": self.samples,
+            "error_rate": round(self.error_rate, 4),
+            "median_latency": round(median, 3) if median is not None else None
+        }
+
+_used_models = contextvars.ContextVar("used_models", default=None)
+
+@contextmanager
+def track_models(models: Optional[List[str]] = None):
+    """Collect the models routed to within this scope (pass a list to share it with worker threads)"""
+    models = [] if models is None else models
+    token = _used_models.set(models)
+    try:
+        yield models
+    finally:
+        _used_models.reset(token)
+
+def current_models() -> Optional[List[str]]:
+    return _used_models.get()
+
+class ModelRouter:
+    """Chooses a model and output budget per call from the endpoint, the input
+    size and the recent latency and error rate of each candidate model.
+
+    Statistics are kept per (rule, model), so a model's latency on large prompts
+    or long outputs is only compared with other models serving the same rule."""
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = rules if rules is not None else load_routing_rules()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _match_rule(self, endpoint: str, input_tokens: int) -> int:
+        """Index of the first rule matching the endpoint and input size"""
+        for index, rule in enumerate(self.rules):
+            endpoints = rule.get("endpoints")
+            if endpoints and endpoint not in endpoints:
+                continue
+            max_input = rule.get("max_input_tokens")
+            if max_input is not None and input_tokens > max_input:
+                continue
+            return index
+        return len(self.rules) - 1
+
+    def _choose_model(self, rule_index: int, candidates: List[str]) -> str:
+        with self._lock:
+            stats = [self._stats.get((rule_index, model)) for model in candidates]
+        measured = [
+            s.median_latency for s in stats
+            if s is not None and s.samples >= MODEL_STATS_MIN_SAMPLES and s.median_latency is not None
+        ]
+        # Models without enough data are assumed to be as fast as the best measured one
+        baseline = min(measured) if measured else 1.0
+
+        best = None
+        for index, (model, model_stats) in enumerate(zip(candidates, stats)):
+            if model_stats is not None and model_stats.samples >= MODEL_STATS_MIN_SAMPLES:
+                if model_stats.error_rate >= MODEL_MAX_ERROR_RATE:
+                    continue
+                latency = model_stats.median_latency or baseline
+                score = latency * (1 + 2 * model_stats.error_rate)
+            else:
+                score = baseline
+            # Earlier models are preferred unless clearly slower or failing
+            score *= 1 + 0.25 * index
+            if best is None or score < best[0]:
+                best = (score, model)
+        return best[1] if best else candidates[0]
+
+    def route(self, endpoint: str, prompt: str) -> Route:
+        """Pick the model and max_output_tokens for a prompt sent by `endpoint`"""
+        input_tokens = estimate_tokens(prompt)
+        rule_index = self._match_rule(endpoint, input_tokens)
+        rule = self.rules[rule_index]
+        model = self._choose_model(rule_index, rule["models"])
+        route = Route(endpoint, model, rule.get("max_output_tokens", 4096), input_tokens, rule_index)
+        print(f"Routing {endpoint} (~{input_tokens} input tokens) to {model} with max_output_tokens={route.max_output_tokens}")
+        return route
+
+    def record(self, rule_index: int, model: str, latency: float, ok: bool):
+        with self._lock:
+            key = (rule_index, model)
+            if key not in self._stats:
+                self._stats[key] = ModelStats()
+            self._stats[key].record(latency, ok)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistics per model, then per routing rule (e.g. "rule 2")"""
+        with self._lock:
+            result = {}
+            for (rule_index, model), stats in sorted(self._stats.items()):
+                result.setdefault(model, {})[f"rule {rule_index}"] = stats.to_dict()
+            return result
+
+    def generate(self, endpoint: str, prompt: str, safety_settings=None, **generation_options):
+        """Route a prompt, call the chosen model and record how the call went.
+
+        `generation_options` (temperature, top_p, ...) are passed to GenerationConfig
+        together with the routed max_output_tokens."""
+        route = self.route(endpoint, prompt)
+        generation_config = GenerationConfig(max_output_tokens=route.max_output_tokens, **generation_options)
+        model = genai.GenerativeModel(route.model)
+        used_models = _used_models.get()
+        if used_models is not None and route.model not in used_models:
+            used_models.append(route.model)
+
+        check_deadline(f"{endpoint} generation")
+        started = time.monotonic()
+        try:
+            response = model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                request_options=request_options()
+            )
+        except Exception:
+            deadline = current_deadline()
+            # Calls cut short by the caller's own deadline say nothing about the model
+            if deadline is None or deadline.remaining() > 0:
+                self.record(route.rule, route.model, time.monotonic() - started, False)
+            raise
+        self.record(route.rule, route.model, time.monotonic() - started, True)
+        return response
+
+model_router = ModelRouter()
@@ -0,0 +1,162 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from dotenv import load_dotenv
+from utils.artifact_store import artifact_store
+from utils.deadline import Deadline, DeadlineExceeded, deadline_scope
+from utils.model_router import track_models
+from utils.profiler import profile_store
+
+# Load environment variables
+load_dotenv()
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "False").lower() == "true"
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", 16))
+# Prefetches only start while fewer than this many interactive requests are running
+# (1 = only when the server is otherwise idle)
+PREFETCH_MAX_INTERACTIVE = int(os.getenv("PREFETCH_MAX_INTERACTIVE", 1))
+# Upper bound on prefetches started per minute, to protect the API quota
+PREFETCH_PER_MINUTE = int(os.getenv("PREFETCH_PER_MINUTE", 6))
+# Queued prefetches older than this are dropped as no longer useful
+PREFETCH_MAX_AGE_SECONDS = float(os.getenv("PREFETCH_MAX_AGE_SECONDS", 120))
+PREFETCH_TIMEOUT_SECONDS = float(os.getenv("PREFETCH_TIMEOUT_SECONDS", 90))
+
+PrefetchTask = namedtuple("PrefetchTask", ["kind", "input_key", "compute", "queued_at"])
+
+class Prefetcher:
+    """Low-priority background worker that precomputes likely follow-up artifacts.
+
+    Tasks are only started when interactive traffic leaves spare capacity and
+    the per-minute budget allows it; results go to the artifact store, where
+    the follow-up request finds them."""
+
+    def __init__(self, enabled: bool = PREFETCH_ENABLED):
+        self.enabled = enabled
+        self._queue = queue.Queue(maxsize=PREFETCH_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._running = set()
+        self._interactive = 0
+        self._started = []
+        self._worker = None
+        self.completed = 0
+        self.dropped = 0
+
+    @contextmanager
+    def interactive(self):
+        """Mark an interactive request as running for the duration of the block"""
+        with self._lock:
+            self._interactive += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._interactive -= 1
+
+    def submit(self, kind: str, input_key: str, compute: Callable[[], Optional[Any]]) -> bool:
+        """Queue `compute` to produce the `kind` artifact for `input_key`.
+
+        `compute` returns the payload to store, or None when it failed."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if (kind, input_key) in self._in_flight:
+                return False
+            self._in_flight[(kind, input_key)] = threading.Event()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+                self._worker.start()
+        try:
+            self._queue.put_nowait(PrefetchTask(kind, input_key, compute, time.monotonic()))
+            return True
+        except queue.Full:
+            self._finish(kind, input_key, dropped=True)
+            return False
+
+    def wait(self, kind: str, input_key: str, timeout: float) -> bool:
+        """Wait for a running prefetch of this artifact. Returns False if none is
+        running; queued prefetches are not waited for, since they may never start."""
+        with self._lock:
+            if (kind, input_key) not in self._running:
+                return False
+            event = self._in_flight.get((kind, input_key))
+        if event is None:
+            return False
+        return event.wait(timeout)
+
+    def _finish(self, kind: str, input_key: str, dropped: bool = False):
+        with self._lock:
+            event = self._in_flight.pop((kind, input_key), None)
+            self._running.discard((kind, input_key))
+            if dropped:
+                self.dropped += 1
+            else:
+                self.completed += 1
+        if event is not None:
+            event.set()
+
+    def _has_spare_capacity(self) -> bool:
+        with self._lock:
+            if self._interactive >= PREFETCH_MAX_INTERACTIVE:
+                return False
+            now = time.monotonic()
+            self._started = [t for t in self._started if now - t < 60]
+            if len(self._started) >= PREFETCH_PER_MINUTE:
+                return False
+            self._started.append(now)
+            return True
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            dropped = True
+            try:
+                # Artifacts that already exist cost nothing and do not use the budget
+                if artifact_store.latest(task.kind, task.input_key) is not None:
+                    dropped = False
+                    continue
+                while not self._has_spare_capacity():
+                    if time.monotonic() - task.queued_at > PREFETCH_MAX_AGE_SECONDS:
+                        break
+                    time.sleep(0.5)
+                else:
+                    self._compute(task)
+                    dropped = False
+            except (Exception, DeadlineExceeded) as e:
+                print(f"Prefetch of {task.kind} for {task.input_key} failed: {str(e)}")
+            finally:
+                self._finish(task.kind, task.input_key, dropped=dropped)
+
+    def _compute(self, task: PrefetchTask):
+        print(f"Prefetching {task.kind} for {task.input_key}")
+        with self._lock:
+            self._running.add((task.kind, task.input_key))
+        # Prefetches run outside any request, so sampled ones are profiled on their own
+        profile = profile_store.start('cprofile', stored=False) if profile_store.should_sample() else None
+        try:
+            with deadline_scope(Deadline(PREFETCH_TIMEOUT_SECONDS)), track_models() as models:
+                payload = task.compute()
+        finally:
+            if profile is not None:
+                profile_store.finish(profile, f"prefetch {task.kind}")
+        if payload is None:
+            return
+        model = payload.get("model") if isinstance(payload, dict) else None
+        artifact_store.save(task.kind, task.input_key, model or ",".join(models) or None, payload)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queued": self._queue.qsize(),
+                "running": len(self._running),
+                "interactive_requests": self._interactive,
+                "completed": self.completed,
+                "dropped": self.dropped
+            }
+
+prefetcher = Prefetcher()
@@ -0,0 +1,340 @@
+import contextvars
+import cProfile
+import hmac
+import itertools
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Profiling is disabled unless a token is configured
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Number of stored profiles kept on disk
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 100))
+# Continuous profiling: profile one request in N and aggregate the results (0 = off)
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SAMPLING_INTERVAL = float(os.getenv("PROFILE_SAMPLING_INTERVAL_MS", 5)) / 1000
+
+PROFILE_MODES = ('cprofile', 'sampling')
+PROFILE_ID = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+PROFILE_EXTENSIONS = {'cprofile': '.pstats', 'sampling': '.speedscope.json'}
+
+def profiling_enabled() -> bool:
+    return bool(PROFILING_TOKEN)
+
+def is_authorized(headers) -> bool:
+    """Check the profiling token sent as 'Authorization: Bearer <token>' or X-Profile-Token"""
+    if not PROFILING_TOKEN:
+        return False
+    token = headers.get('X-Profile-Token', '')
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    return hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+
+def requested_mode(value: Optional[str]) -> Optional[str]:
+    """Map the X-Profile header / ?profile= value to a profiling mode"""
+    if not value:
+        return None
+    value = value.lower()
+    if value in PROFILE_MODES:
+        return value
+    if value in ('1', 'true', 'yes'):
+        return 'cprofile'
+    return None
+
+class SamplingProfiler:
+    """Samples the call stacks of a request's threads at a fixed interval, for speedscope"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLING_INTERVAL):
+        self.interval = interval
+        self.frames = []
+        self._frame_index = {}
+        # Thread id -> (name, samples, weights); worker threads join and leave while it runs
+        self._threads = {}
+        self._active = set()
+        self._lock = threading.Lock()
+        self.add_thread(thread_id)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def add_thread(self, thread_id: int):
+        with self._lock:
+            if thread_id not in self._threads:
+                self._threads[thread_id] = (threading.current_thread().name, [], [])
+            self._active.add(thread_id)
+
+    def remove_thread(self, thread_id: int):
+        with self._lock:
+            self._active.discard(thread_id)
+
+    def _frame_id(self, frame) -> int:
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self._frame_index:
+            self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+        return self._frame_index[key]
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            with self._lock:
+                active = [thread_id for thread_id in self._active if thread_id in frames]
+            for thread_id in active:
+                frame = frames[thread_id]
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                _, samples, weights = self._threads[thread_id]
+                samples.append(stack)
+                weights.append(now - last)
+            last = now
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        """One sampled profile per thread, the request thread first"""
+        with self._lock:
+            threads = list(self._threads.values())
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": self.frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name if index == 0 else f"{name} [{thread_name}]",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights
+                }
+                for index, (thread_name, samples, weights) in enumerate(threads)
+                if index == 0 or samples
+            ],
+            "name": name,
+            "exporter": "vyasa"
+        }
+
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+
+def current_profile() -> Optional["RequestProfile"]:
+    return _active_profile.get()
+
+class RequestProfile:
+    """A running profile of one request, including the worker threads it hands work to"""
+
+    def __init__(self, mode: str, stored: bool):
+        self.mode = mode
+        self.stored = stored
+        self.profiler = None
+        self._thread_profilers = []
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        try:
+            if self.mode == 'sampling':
+                self.profiler = SamplingProfiler(threading.get_ident())
+                self.profiler.start()
+            else:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+        except ValueError as e:
+            # Only one cProfile profiler can be active at a time on newer Pythons
+            print(f"Could not start {self.mode} profiler: {str(e)}")
+            self.profiler = None
+            return False
+        _active_profile.set(self)
+        return True
+
+    def stop(self):
+        if _active_profile.get() is self:
+            _active_profile.set(None)
+        if self.profiler is None:
+            return
+        if self.mode == 'sampling':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    @contextmanager
+    def thread_scope(self):
+        """Profile the current worker thread as part of this request"""
+        if self.profiler is None:
+            yield
+            return
+        token = _active_profile.set(self)
+        try:
+            if self.mode == 'sampling':
+                thread_id = threading.get_ident()
+                self.profiler.add_thread(thread_id)
+                try:
+                    yield
+                finally:
+                    self.profiler.remove_thread(thread_id)
+                return
+            # cProfile hooks one thread per profiler on Python 3.11, so each worker gets its own
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Newer Pythons profile every thread from the request's profiler already
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+                with self._lock:
+                    self._thread_profilers.append(profiler)
+        finally:
+            _active_profile.reset(token)
+
+    def stats(self) -> pstats.Stats:
+        """cProfile stats of the request thread merged with those of its workers"""
+        stats = pstats.Stats(self.profiler)
+        with self._lock:
+            for profiler in self._thread_profilers:
+                stats.add(profiler)
+        return stats
+
+@contextmanager
+def profile_scope(profile: Optional[RequestProfile]):
+    """Hand a request's profile over to a worker thread (worker threads do not inherit it)"""
+    if profile is None:
+        yield
+    else:
+        with profile.thread_scope():
+            yield
+
+class ProfileStore:
+    """Keeps profile dumps on disk and aggregates sampled cProfile runs"""
+
+    def __init__(self, directory: str = PROFILE_DIR, sample_rate: int = PROFILE_SAMPLE_RATE):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._aggregate = None
+        self._aggregated_requests = 0
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0
+
+    def start(self, mode: str, stored: bool) -> Optional[RequestProfile]:
+        profile = RequestProfile(mode, stored)
+        return profile if profile.start() else None
+
+    def finish(self, profile: RequestProfile, name: str) -> Optional[str]:
+        """Stop a profile; store it if requested, else fold it into the aggregate.
+        Returns the id of the stored profile."""
+        profile.stop()
+        if profile.profiler is None:
+            return None
+        if not profile.stored:
+            if profile.mode == 'cprofile':
+                self._aggregate_stats(profile.stats())
+            return None
+
+        profile_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, profile_id + PROFILE_EXTENSIONS[profile.mode])
+        if profile.mode == 'sampling':
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(profile.profiler.to_speedscope(name), file)
+        else:
+            profile.stats().dump_stats(path)
+        self._prune()
+        return profile_id
+
+    def _aggregate_stats(self, stats: pstats.Stats):
+        with self._lock:
+            if self._aggregate is None:
+                self._aggregate = stats
+            else:
+                self._aggregate.add(stats)
+            self._aggregated_requests += 1
+
+    def _prune(self):
+        profiles = self.list()
+        for entry in profiles[PROFILE_KEEP:]:
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Stored profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for filename in os.listdir(self.directory):
+            for mode, extension in PROFILE_EXTENSIONS.items():
+                if filename.endswith(extension):
+                    path = os.path.join(self.directory, filename)
+                    profiles.append({
+                        "id": filename[:-len(extension)],
+                        "mode": mode,
+                        "size": os.path.getsize(path),
+                        "created_at": os.path.getmtime(path),
+                        "path": path
+                    })
+        profiles.sort(key=lambda entry: entry["created_at"], reverse=True)
+        return profiles
+
+    def find(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        for mode, extension in PROFILE_EXTENSIONS.items():
+            path = os.path.join(self.directory, profile_id + extension)
+            if os.path.exists(path):
+                return {"id": profile_id, "mode": mode, "path": path}
+        return None
+
+    def hot_functions(self, limit: int = 30, sort: str = 'tottime') -> Dict[str, Any]:
+        """Aggregated hot-function report over the sampled requests"""
+        with self._lock:
+            if self._aggregate is None:
+                return {"requests": 0, "functions": []}
+            return {
+                "requests": self._aggregated_requests,
+                "functions": summarize_stats(self._aggregate, limit, sort)
+            }
+
+def summarize_stats(stats: pstats.Stats, limit: int = 30, sort: str = 'tottime') -> List[Dict[str, Any]]:
+    """Top functions of a pstats.Stats, sorted by 'tottime' or 'cumtime'"""
+    index = 3 if sort == 'cumtime' else 2
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "primitive_calls": primitive_calls,
+            "calls": calls,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6)
+        }
+        for (filename, line, name), (primitive_calls, calls, tottime, cumtime, _) in rows
+    ]
+
+profile_store = ProfileStore()
@@ -1,8 +1,8 @@
 import os
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig, HarmCategory, HarmBlockThreshold
+from google.generativeai.types import HarmCategory, HarmBlockThreshold
 from utils.gemini import configure_gemini_api
 from utils.document_analyzer import extract_text_from_file
+from utils.model_router import model_router
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,24 +11,20 @@ load_dotenv()
 def generate_question_bank(file_path, file_type, file_name):
     """Generate a question bank from document content using Gemini API"""
     file_content = extract_text_from_file(file_path, file_type)
+    return generate_questions_from_text(file_content, file_name)
+
+def generate_questions_from_text(file_content, file_name):
+    """Generate a question bank from already extracted document text"""
     success, error_message = configure_gemini_api()
     if not success:
         return {"error": f"API Configuration Error: {error_message}"}
     try:  
-        generation_config = GenerationConfig(
-            temperature=0.7,
-            top_p=0.95,
-            top_k=40,
-            max_output_tokens=4096
-        )
         safety_settings = {
             HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
             HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
         }
         
-        model = genai.GenerativeModel('gemini-2.0-flash-exp-image-generation')
-        
         prompt = f"""
         You are tasked with creating a comprehensive question bank from the document content provided below.
 
@@ -51,10 +47,13 @@ def generate_question_bank(file_path, file_type, file_name):
         8. Ensure that any URLs provided are in the format without any [],() or kind of bracket.
         """
         
-        response = model.generate_content(
+        response = model_router.generate(
+            "questions",
             prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
+            safety_settings=safety_settings,
+            temperature=0.7,
+            top_p=0.95,
+            top_k=40
         )
         
         if response.text:
@@ -1,8 +1,8 @@
 import os
 import json
 from typing import List, Dict, Any
-import google.generativeai as genai
 from utils.gemini import configure_gemini_api
+from utils.model_router import model_router
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,8 +16,9 @@ class DynamicLearningRoadmapGenerator:
         success, error = configure_gemini_api()
         if not success:
             raise Exception(f"Failed to configure Gemini API: {error}")
-            
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp-image-generation')
+        
+        # Model choice is made per prompt by the model router
+        self.router = model_router
         
         # Dynamic resource fetching configuration
         self.resource_categories = [
@@ -79,7 +80,7 @@ class DynamicLearningRoadmapGenerator:
         Keep the overview concise but informative, around 3-4 paragraphs.
         """
         
-        response = self.model.generate_content(prompt)
+        response = self.router.generate("roadmap", prompt)
         return response.text
 
     def _generate_learning_stages(self, topic: str) -> List[Dict]:
@@ -100,7 +101,7 @@ class DynamicLearningRoadmapGenerator:
         Ensure the stages build progressively and provide a clear learning trajectory.
         """
         
-        response = self.model.generate_content(prompt)
+        response = self.router.generate("roadmap", prompt)
         
         # Return the raw text for frontend parsing
         return response.text
@@ -129,7 +130,7 @@ class DynamicLearningRoadmapGenerator:
         don't add any other text except the resources
         """
         
-        response = self.model.generate_content(prompt)
+        response = self.router.generate("roadmap", prompt)
         return response.text
 
     def _generate_learning_projects(self, topic: str) -> str:
@@ -151,5 +152,5 @@ class DynamicLearningRoadmapGenerator:
         Make sure the projects are practical, engaging, and progressively challenging.
         """
         
-        response = self.model.generate_content(prompt)
+        response = self.router.generate("roadmap", prompt)
         return response.text 
\ No newline at end of file
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from werkzeug.utils import secure_filename
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+MB = 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Per-type size limits, in bytes
+UPLOAD_LIMITS = {
+    'pdf': int(os.getenv("MAX_PDF_UPLOAD_MB", 25)) * MB,
+    'docx': int(os.getenv("MAX_DOCX_UPLOAD_MB", 15)) * MB,
+    'doc': int(os.getenv("MAX_DOCX_UPLOAD_MB", 15)) * MB,
+    'xlsx': int(os.getenv("MAX_EXCEL_UPLOAD_MB", 10)) * MB,
+    'xls': int(os.getenv("MAX_EXCEL_UPLOAD_MB", 10)) * MB,
+    'txt': int(os.getenv("MAX_TXT_UPLOAD_MB", 5)) * MB
+}
+# Allowance for multipart boundaries and form fields on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+# Whole-request cap, enforced by Flask before the body is read
+MAX_UPLOAD_SIZE = max(UPLOAD_LIMITS.values()) + MULTIPART_OVERHEAD
+
+# MIME types understood by extract_text_from_file
+KIND_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'doc': 'application/msword',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'xls': 'application/vnd.ms-excel',
+    'txt': 'text/plain'
+}
+
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+PDF_MAGIC = b'%PDF-'
+TEXT_EXTENSIONS = ('.txt', '.md', '.csv')
+
+SavedUpload = namedtuple("SavedUpload", ["path", "temp_dir", "filename", "kind", "content_type", "sha256", "size"])
+
+class UploadError(Exception):
+    """Raised when an upload is rejected; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def sniff_file_kind(head, filename, declared_type):
+    """Identify an upload from its first bytes, using the name/MIME type only to
+    tell apart formats that share a container (OOXML zip, legacy OLE)."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    declared_type = (declared_type or '').split(';')[0].strip().lower()
+
+    if head.startswith(PDF_MAGIC):
+        return 'pdf'
+    if head.startswith(ZIP_MAGIC):
+        if extension == '.xlsx' or declared_type == KIND_CONTENT_TYPES['xlsx']:
+            return 'xlsx'
+        if extension == '.docx' or declared_type == KIND_CONTENT_TYPES['docx']:
+            return 'docx'
+        return None
+    if head.startswith(OLE_MAGIC):
+        if extension == '.xls' or declared_type == KIND_CONTENT_TYPES['xls']:
+            return 'xls'
+        if extension == '.doc' or declared_type == KIND_CONTENT_TYPES['doc']:
+            return 'doc'
+        return None
+    if b'\x00' not in head and (declared_type.startswith('text/') or extension in TEXT_EXTENSIONS):
+        return 'txt'
+    return None
+
+def save_upload(file, request_content_length=None):
+    """Stream an uploaded file to a temporary directory.
+
+    The type is sniffed from the first chunk and the per-type size limit is
+    enforced while copying, so unsupported or oversize files are rejected
+    early. The SHA-256 of the content is computed on the way through."""
+    head = file.stream.read(UPLOAD_CHUNK_SIZE)
+    if not head:
+        raise UploadError("Uploaded file is empty", 400)
+
+    kind = sniff_file_kind(head, file.filename, file.content_type)
+    if kind is None:
+        raise UploadError("Unsupported file type", 415)
+
+    limit = UPLOAD_LIMITS[kind]
+    if request_content_length and request_content_length > limit + MULTIPART_OVERHEAD:
+        raise UploadError(f"File too large: {kind.upper()} uploads are limited to {limit // MB} MB", 413)
+
+    filename = secure_filename(file.filename or '') or f"upload.{kind}"
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, filename)
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(path, 'wb') as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > limit:
+                    raise UploadError(f"File too large: {kind.upper()} uploads are limited to {limit // MB} MB", 413)
+                hasher.update(chunk)
+                out.write(chunk)
+                chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    return SavedUpload(path, temp_dir, file.filename, kind, KIND_CONTENT_TYPES[kind], hasher.hexdigest(), size)
+
+def remove_upload(saved):
+    """Delete the temporary directory holding a saved upload"""
+    shutil.rmtree(saved.temp_dir, ignore_errors=True)